@@ -1,15 +1,19 @@
 # requires-python = ">=3.11"
-# dependencies = ["fastapi", "uvicorn", "python-dotenv", "httpx", "beautifulsoup4"]
+# dependencies = ["fastapi", "uvicorn", "python-dotenv", "httpx[http2]", "selectolax", "orjson"]
 
 import os
-import json
 import base64
+import functools
 import re
 import asyncio
+import hashlib
+import time
 import traceback
+from collections import OrderedDict
 
 import httpx
-from bs4 import BeautifulSoup
+import orjson
+from selectolax.lexbor import LexborHTMLParser
 from fastapi import FastAPI, Request, BackgroundTasks
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
@@ -23,6 +27,8 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 AIPIPE_TOKEN = os.getenv("AIPIPE_TOKEN")
 AIPIPE_URL = "https://aipipe.org/openrouter/v1/chat/completions"
 LLM_MODEL = "openai/gpt-4.1-nano"
+LLM_CACHE_TTL = 60  # seconds
+LLM_CACHE_MAX = 256  # entries
 
 if not SECRET_KEY or not AIPIPE_TOKEN:
     print("❌ ERROR: SECRET_KEY or AIPIPE_TOKEN missing in environment")
@@ -30,8 +36,23 @@ if not SECRET_KEY or not AIPIPE_TOKEN:
 # Global FastAPI app
 app = FastAPI()
 
-# Global async http client
-client = httpx.AsyncClient(timeout=60)
+# Global async http client (HTTP/2 multiplexes LLM calls to aipipe.org)
+client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60),
+    timeout=httpx.Timeout(60.0, connect=5.0)
+)
+
+# Precompiled patterns used on every quiz page
+_RE_ATOB = re.compile(r'atob\("([^"]+)"\)')
+_RE_SUBMIT_URL = re.compile(r'https?://[^"]+/submit')
+
+# LLM answers keyed by question hash → (expiry_ts, answer), oldest first
+_ANSWER_CACHE: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+
+def _question_key(question_text: str) -> str:
+    return hashlib.blake2b(question_text.encode(), digest_size=16).hexdigest()
 
 
 # -----------------------------------------------------
@@ -40,7 +61,15 @@ client = httpx.AsyncClient(timeout=60)
 async def ask_llm(question_text: str) -> str:
     """
     Sends the question to AIPipe LLM and returns answer text.
+    Repeated questions within LLM_CACHE_TTL reuse the previous answer.
     """
+    key = _question_key(question_text)
+    cached = _ANSWER_CACHE.get(key)
+    if cached:
+        if time.time() < cached[0]:
+            return cached[1]
+        _ANSWER_CACHE.pop(key, None)
+
     payload = {
         "model": LLM_MODEL,
         "messages": [
@@ -56,11 +85,50 @@ async def ask_llm(question_text: str) -> str:
         "Content-Type": "application/json"
     }
 
-    resp = await client.post(AIPIPE_URL, headers=headers, json=payload)
+    resp = await client.post(AIPIPE_URL, headers=headers, content=orjson.dumps(payload))
     resp.raise_for_status()
 
-    data = resp.json()
-    return data["choices"][0]["message"]["content"].strip()
+    data = orjson.loads(resp.content)
+    answer = data["choices"][0]["message"]["content"].strip()
+
+    _ANSWER_CACHE[key] = (time.time() + LLM_CACHE_TTL, answer)
+    if len(_ANSWER_CACHE) > LLM_CACHE_MAX:
+        _ANSWER_CACHE.popitem(last=False)
+    return answer
+
+
+# -----------------------------------------------------
+# Helpers: Parse quiz page (cached for re-fetched pages)
+# -----------------------------------------------------
+@functools.lru_cache(maxsize=64)
+def extract_question_text(page_html: str) -> str | None:
+    """
+    Returns the question text, decoding the atob(...) payload if present.
+    """
+    m = _RE_ATOB.search(page_html)
+
+    if m:
+        decoded_html = base64.b64decode(m.group(1)).decode("utf-8")
+        tree = LexborHTMLParser(decoded_html)
+    else:
+        tree = LexborHTMLParser(page_html)
+
+    # Match BeautifulSoup's get_text(): leave out script/style contents
+    tree.strip_tags(["script", "style"])
+
+    q = tree.css_first("div#result") or tree.css_first("div.question")
+    if not q:
+        return None
+
+    return q.text(strip=True)
+
+
+def find_submit_url_in_html(page_html: str) -> str | None:
+    """
+    Returns the absolute submit URL found in the page, if any.
+    """
+    m = _RE_SUBMIT_URL.search(page_html)
+    return m.group(0) if m else None
 
 
 # -----------------------------------------------------
@@ -81,32 +149,20 @@ async def solve_quiz_chain(start_url: str, email: str, secret: str):
         r = await client.get(url)
         page_html = r.text
 
-        # 2. Extract base64 HTML inside atob(...)
-        m = re.search(r'atob\("([^"]+)"\)', page_html)
-        decoded_html = None
-
-        if m:
-            decoded_html = base64.b64decode(m.group(1)).decode("utf-8")
-            soup = BeautifulSoup(decoded_html, "html.parser")
-        else:
-            soup = BeautifulSoup(page_html, "html.parser")
-
-        # 3. Extract question text
-        q = soup.find("div", {"id": "result"}) or soup.find("div", class_="question")
-        if not q:
+        # 2–3. Extract question text (from base64 HTML inside atob(...) if present)
+        question_text = extract_question_text(page_html)
+        if question_text is None:
             print("❌ No question found")
             return {"error": "No question found"}
 
-        question_text = q.get_text(strip=True)
         print("\nQUESTION:", question_text)
 
         # 4. Get submit URL
-        m2 = re.search(r'https?://[^"]+/submit', page_html)
-        if not m2:
+        submit_url = find_submit_url_in_html(page_html)
+        if not submit_url:
             print("❌ Could not find submit_url")
             return {"error": "Submit URL not found"}
 
-        submit_url = m2.group(0)
         print("SUBMIT URL:", submit_url)
 
         # 5. Ask LLM for the answer
@@ -123,11 +179,15 @@ async def solve_quiz_chain(start_url: str, email: str, secret: str):
         }
 
         print("Submitting answer:", payload)
-        resp = await client.post(submit_url, json=payload)
+        resp = await client.post(
+            submit_url,
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"}
+        )
 
         # If not JSON → quiz ended
         try:
-            result = resp.json()
+            result = orjson.loads(resp.content)
         except:
             print("\nRAW RESPONSE (end):")
             print(resp.text)
@@ -135,6 +195,10 @@ async def solve_quiz_chain(start_url: str, email: str, secret: str):
 
         print("SERVER RESPONSE:", result)
 
+        # Never resubmit a rejected answer from cache
+        if not isinstance(result, dict) or not result.get("correct"):
+            _ANSWER_CACHE.pop(_question_key(question_text), None)
+
         # If chain ended
         if "url" not in result:
             print("\n🎉 QUIZ COMPLETED")
@@ -177,7 +241,7 @@ async def process_request(data):
 async def receive_request(request: Request, background_tasks: BackgroundTasks):
 
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
     except:
         return JSONResponse({"error": "Invalid JSON"}, status_code=400)
 